@@ -0,0 +1,131 @@
+import asyncio
+import secrets
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Annotated, Any, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.core.profiling import StackSampler
+
+# Profiles of the latest requests sent with the debug header
+request_profiles: OrderedDict[str, str] = OrderedDict()
+MAX_REQUEST_PROFILES = 32
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return (
+        settings.ADMIN_TOKEN is not None
+        and token is not None
+        and secrets.compare_digest(token, settings.ADMIN_TOKEN)
+    )
+
+
+async def verify_admin(
+    x_admin_token: Annotated[Optional[str], Header()] = None,
+) -> None:
+    if settings.ADMIN_TOKEN is None:
+        raise HTTPException(status_code=404, detail="admin endpoints disabled")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(verify_admin)]
+)
+
+
+@router.get("/loop")
+async def get_loop_stats(request: Request) -> dict[str, Any]:
+    stats: dict[str, Any] = request.app.state.loop_monitor.stats()
+    return stats
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: Annotated[float, Query(gt=0)] = 10,
+    interval: Annotated[float, Query(ge=0.001, le=1)] = 0.005,
+) -> str:
+    """
+    Sample all threads of the worker for some seconds, in the folded format.
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be at most {settings.PROFILE_MAX_SECONDS}",
+        )
+
+    sampler = StackSampler(interval=interval)
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile = await asyncio.to_thread(sampler.stop)
+    return profile
+
+
+@router.get("/profile/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str) -> str:
+    if profile_id not in request_profiles:
+        raise HTTPException(status_code=404, detail="profile not found")
+    return request_profiles[profile_id]
+
+
+class ProfileRequestMiddleware:
+    """
+    Profile the event loop thread while handling requests with the debug header.
+
+    Sampling runs until the last chunk of the response body is sent, so
+    streamed responses are profiled in full. Requests handled concurrently on
+    the same loop show up in the profile too.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if "x-debug-profile" not in headers or not is_admin(
+            headers.get("x-admin-token")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # The ID is sent with the headers, the profile is stored once complete
+        profile_id = str(uuid.uuid4())
+        sampler = StackSampler(thread_id=threading.get_ident())
+        stopped = False
+
+        async def stop_sampler() -> None:
+            nonlocal stopped
+            if stopped:
+                return
+            stopped = True
+            request_profiles[profile_id] = await asyncio.to_thread(sampler.stop)
+            while len(request_profiles) > MAX_REQUEST_PROFILES:
+                request_profiles.popitem(last=False)
+
+        async def send_with_profile(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            elif message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                # Store the profile before the client sees the response end
+                await stop_sampler()
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            await stop_sampler()
@@ -1,53 +1,111 @@
+import asyncio
 import uuid
+from collections.abc import AsyncIterator, Coroutine
 from typing import Annotated, Any, cast
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
 from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from app.core.agents import BaseAgent, OrchestratorAgent, PlanningAgent, RetrievalAgent
-from app.core.tools import BaseTool, WebSearchTool
+from app.core.agents import OrchestratorAgent, RetrievalAgent
+from app.core.batch import run_batch
+from app.core.memory import MessageStore
+from app.core.system import delete_agent_system, initialize_agent_system
 from app.core.utils import generate_uuid
 from app.schemas.chat import Chat, ChatRequest, ChatResponse, Message
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-# In-memory storage for chats
+# In-memory storage for chats, the history holds IDs into the chat's message store
 chats: dict[str, dict[str, Any]] = {}
 
 
+class ClientDisconnectedError(Exception):
+    pass
+
+
 @router.post("", response_model=ChatResponse)
-async def respond(request: ChatRequest) -> Any:
+async def respond(request: ChatRequest, http_request: Request) -> Any:
     chat_id = request.chat_id or str(uuid.uuid4())
 
     if chat_id not in chats:
-        agent: OrchestratorAgent = await _initialize_agent_system(chat_id)
-        messages: list[Message] = []
-        chats[chat_id] = {"agent": agent, "messages": messages}
+        store = MessageStore()
+        agent: OrchestratorAgent = await initialize_agent_system(chat_id, store)
+        message_ids: list[str] = []
+        chats[chat_id] = {"agent": agent, "store": store, "message_ids": message_ids}
     else:
         chat = chats[chat_id]
         agent = chat["agent"]
-        messages = chat["messages"]
+        store = chat["store"]
+        message_ids = chat["message_ids"]
 
-    messages.append(Message(role="user", content=request.message))
+    user_message = HumanMessage(content=request.message, id=generate_uuid())
+    user_message_id = store.put(user_message)
+    message_ids.append(user_message_id)
 
     try:
-        response = await agent.run({"messages": [request.message]})
-        assistant_message = str(response["messages"][-1].content)
-        messages.append(Message(role="assistant", content=assistant_message))
-        return ChatResponse(chat_id=chat_id, response=assistant_message)
+        response = await _run_until_disconnected(
+            http_request, agent.run({"messages": [user_message]})
+        )
+        assistant_message = response["messages"][-1]
+        message_ids.append(store.put(assistant_message))
+        return ChatResponse(chat_id=chat_id, response=str(assistant_message.content))
+    except ClientDisconnectedError as e:
+        # The agents rolled the thread back, keep the history in line with it
+        message_ids.remove(user_message_id)
+        store.discard([user_message_id])
+        raise HTTPException(status_code=499, detail="Client closed request") from e
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error processing request: {str(e)}"
         ) from e
 
 
+@router.post("/batch")
+async def respond_batch(
+    request: Request,
+    concurrency: Annotated[int, Query(ge=1, le=64)] = 8,
+    skip: Annotated[list[str] | None, Query()] = None,
+) -> StreamingResponse:
+    """
+    Answer a JSONL stream of chat items, streaming JSONL results back.
+    """
+    batch_id = str(uuid.uuid4())
+    agent = await initialize_agent_system(batch_id)
+
+    # The body is read up front, the response stream cannot share `receive`
+    body = await request.body()
+
+    async def stream_results() -> AsyncIterator[str]:
+        results = run_batch(
+            agent,
+            _iter_lines(body.decode("utf-8").splitlines()),
+            batch_id=batch_id,
+            concurrency=concurrency,
+            skip_ids=set(skip or []),
+        )
+        try:
+            async for result in results:
+                yield result.model_dump_json() + "\n"
+        finally:
+            await delete_agent_system(agent)
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
 @router.get("/{chat_id}", response_model=Chat)
 async def get_chat(chat_id: str) -> Any:
     if chat_id not in chats:
         raise HTTPException(status_code=404, detail="chat not found")
 
-    messages = chats[chat_id]["messages"]
+    store: MessageStore = chats[chat_id]["store"]
+    messages = []
+    for message_id in chats[chat_id]["message_ids"]:
+        message = store.get(message_id)
+        role = "user" if isinstance(message, HumanMessage) else "assistant"
+        messages.append(Message(role=role, content=str(message.content)))
     return Chat(id=chat_id, messages=messages)
 
 
@@ -89,25 +147,37 @@ async def upload_files(
     return {"message": "Documents added successfully"}
 
 
-async def _initialize_agent_system(chat_id: str) -> OrchestratorAgent:
-    """Initialize the agent system based on the requested agent type."""
-
-    model_name = "gpt-4o-mini"
-    tools: list[BaseTool] = [WebSearchTool()]
-    agents: list[BaseAgent] = [
-        PlanningAgent(
-            thread_id=chat_id,
-            model_name=model_name,
-            tools=tools,
-        ),
-        RetrievalAgent(
-            thread_id=chat_id,
-            model_name=model_name,
-        ),
-    ]
-
-    return OrchestratorAgent(
-        thread_id=chat_id,
-        model_name=model_name,
-        managed_agents=agents,
-    )
+async def _iter_lines(lines: list[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+async def _run_until_disconnected(
+    request: Request, coroutine: Coroutine[Any, Any, dict[str, Any]]
+) -> dict[str, Any]:
+    """Await a coroutine, cancelling it if the client disconnects meanwhile."""
+
+    task = asyncio.create_task(coroutine)
+    disconnect = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        # Failing to watch the client is not a disconnect, surface the error
+        error = disconnect.exception()
+        if error is not None:
+            raise error
+        raise ClientDisconnectedError
+    finally:
+        disconnect.cancel()
+        if disconnect.done() and not disconnect.cancelled():
+            disconnect.exception()
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body is already read, so the next message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
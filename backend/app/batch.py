@@ -0,0 +1,76 @@
+"""
+Replay a JSONL file of chat items through the agent system.
+
+Usage:
+    python -m app.batch prompts.jsonl results.jsonl --concurrency 8
+
+Results are appended to the output file as they complete, and items already
+present there are skipped, so an interrupted run resumes where it stopped.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+from app.core.batch import run_batch
+from app.core.system import delete_agent_system, initialize_agent_system
+from app.core.utils import generate_uuid
+
+
+async def _read_lines(path: Path) -> AsyncIterator[str]:
+    with path.open(encoding="utf-8") as file:
+        for line in file:
+            yield line
+
+
+def _finished_ids(path: Path) -> set[str]:
+    if not path.exists():
+        return set()
+
+    finished = set()
+    with path.open(encoding="utf-8") as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if result.get("error") is None:
+                finished.add(str(result["id"]))
+    return finished
+
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("input", type=Path, help="JSONL file of chat items")
+    parser.add_argument("output", type=Path, help="JSONL file to append results to")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    batch_id = generate_uuid()
+    agent = await initialize_agent_system(batch_id)
+    skip_ids = _finished_ids(args.output)
+
+    failed = 0
+    try:
+        with args.output.open("a", encoding="utf-8") as output:
+            async for result in run_batch(
+                agent,
+                _read_lines(args.input),
+                batch_id=batch_id,
+                concurrency=args.concurrency,
+                skip_ids=skip_ids,
+            ):
+                failed += result.error is not None
+                output.write(result.model_dump_json() + "\n")
+                output.flush()
+    finally:
+        await delete_agent_system(agent)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,5 +14,50 @@ class Settings(BaseSettings):
 
     PROJECT_NAME: str
 
+    # Admin endpoints are disabled unless a token is set
+    ADMIN_TOKEN: str | None = None
+
+    # Event loop monitoring and profiling, durations in seconds
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL: float = 0.5
+    LOOP_SLOW_CALLBACK_THRESHOLD: float = 0.1
+    PROFILE_MAX_SECONDS: float = 60.0
+
+    # Chat models, e.g. AGENT_MODELS='{"planning": "gpt-4o"}' and
+    # NODE_MODELS='{"planning": {"process_tools": "gpt-4o-mini"}}'
+    MODEL_NAME: str = "gpt-4o-mini"
+    AGENT_MODELS: dict[str, str] = {}
+    NODE_MODELS: dict[str, dict[str, str]] = {}
+
+    # Models tried in order when a model is slow or rate-limited,
+    # e.g. MODEL_FALLBACKS='{"gpt-4o": ["gpt-4o-mini"]}'
+    MODEL_FALLBACKS: dict[str, list[str]] = {}
+    MODEL_TIMEOUT: float = 30.0
+
+    # Retrieved documents: candidates per query, MMR selection and token budget
+    RETRIEVAL_FETCH_K: int = 10
+    RETRIEVAL_TOP_K: int = 8
+    RETRIEVAL_MMR_LAMBDA: float = 0.5
+    RETRIEVAL_TOKEN_BUDGET: int | None = 2000
+    RETRIEVAL_CACHE_SIZE: int = 128
+
+    # Embeddings, at the model's native size unless dimensions are set.
+    # Quantized modes search an in-memory index, then rescore the best
+    # EMBEDDING_RESCORE_FACTOR * RETRIEVAL_FETCH_K candidates at full precision
+    EMBEDDING_MODEL: str = "text-embedding-3-large"
+    EMBEDDING_DIMENSIONS: int | None = None
+    EMBEDDING_QUANTIZATION: Literal["none", "int8", "binary"] = "none"
+    EMBEDDING_RESCORE_FACTOR: int = 4
+
+    # Checkpoints kept per thread by each agent, at least two so the parent of
+    # the latest checkpoint survives, unbounded if None
+    CHECKPOINT_MAX_PER_THREAD: int | None = Field(default=2, ge=2)
+
+    # Speculative direct answers in the orchestrator, for short messages in
+    # threads whose moving average of direct answers reaches the confidence
+    ORCHESTRATOR_SPECULATIVE: bool = False
+    ORCHESTRATOR_SPECULATIVE_MAX_LENGTH: int = 280
+    ORCHESTRATOR_SPECULATIVE_MIN_CONFIDENCE: float = Field(default=0.5, ge=0, le=1)
+
 
 settings = Settings()  # type: ignore
@@ -1,14 +1,19 @@
+import asyncio
 from abc import ABC
-from typing import Annotated, Any
+from collections.abc import Callable
+from typing import Annotated, Any, Optional
 
 from langchain.chat_models.base import BaseChatModel
-from langchain_core.messages import AnyMessage
-from langchain_core.runnables import RunnableConfig
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import AnyMessage, BaseMessage, RemoveMessage
+from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import add_messages, state
 from pydantic import BaseModel
 
+from app.config import settings
+from app.core.memory import MessageRefSerializer, MessageStore, PrunedMemorySaver
+
 
 class BaseState(BaseModel):
     messages: Annotated[list[AnyMessage], add_messages]
@@ -22,26 +27,133 @@ class BaseAgent(ABC):
     name: str
     description: str
 
-    def __init__(self, *, thread_id: str, model_name: str) -> None:
+    def __init__(
+        self,
+        *,
+        thread_id: str,
+        model_name: str,
+        node_models: Optional[dict[str, str]] = None,
+        message_store: Optional[MessageStore] = None,
+    ) -> None:
         """
         Initialize the base agent with core attributes.
+
+        Agents sharing a `message_store` keep a single copy of each message
+        across their checkpoints.
         """
         self.thread_id = thread_id
         self.model_name = model_name
-        self.model = self._load_chat_model()
-        self.memory = MemorySaver()
+        self.node_models = node_models or {}
+        self._models: dict[str, BaseChatModel] = {}
+        self.message_store = message_store
+        self.memory = PrunedMemorySaver(
+            max_checkpoints=settings.CHECKPOINT_MAX_PER_THREAD,
+            serde=(
+                MessageRefSerializer(message_store)
+                if message_store is not None
+                else None
+            ),
+        )
         self._graph: state.CompiledStateGraph | None = None
 
-    def _load_chat_model(self) -> BaseChatModel:
+    def _load_chat_model(self, model_name: Optional[str] = None) -> BaseChatModel:
+        """
+        Get the model instance to use for the agent, shared by model name.
+        """
+        model_name = model_name or self.model_name
+        if model_name not in self._models:
+            if settings.MODEL_FALLBACKS.get(model_name):
+                # Fail fast so a slow or rate-limited tier hands over to the next
+                model = ChatOpenAI(
+                    model=model_name,
+                    timeout=settings.MODEL_TIMEOUT,
+                    max_retries=0,
+                )
+            else:
+                model = ChatOpenAI(model=model_name)
+            self._models[model_name] = model
+        return self._models[model_name]
+
+    def get_model(
+        self,
+        node: str,
+        bind: Optional[
+            Callable[[BaseChatModel], Runnable[LanguageModelInput, Any]]
+        ] = None,
+    ) -> Runnable[LanguageModelInput, Any]:
         """
-        Get the model instance to use for the agent.
+        Get the model to use for a graph node, with its configured fallbacks.
         """
-        return ChatOpenAI(model=self.model_name)
+        model_name = self.node_models.get(node, self.model_name)
+        model_names = [model_name, *settings.MODEL_FALLBACKS.get(model_name, [])]
 
-    async def run(self, inputs: dict[str, Any]) -> dict[str, Any]:
+        runnables = []
+        for name in model_names:
+            model = self._load_chat_model(name)
+            runnables.append(bind(model) if bind else model)
+
+        primary, *fallbacks = runnables
+        return primary.with_fallbacks(fallbacks) if fallbacks else primary
+
+    async def run(
+        self, inputs: dict[str, Any], thread_id: Optional[str] = None
+    ) -> dict[str, Any]:
+        """
+        Run the agent graph on the agent's thread, or on `thread_id` if given.
+
+        If the run is cancelled, the messages it added are removed again so the
+        thread is left as it was before the run. Removed messages are dropped
+        from the message store too, except for the input messages, which the
+        caller may still refer to.
+        """
         if self._graph is None:
             raise ValueError("Graph not initialized.")
 
-        config: RunnableConfig = {"configurable": {"thread_id": self.thread_id}}
-        response: dict[str, Any] = await self._graph.ainvoke(inputs, config)
+        config: RunnableConfig = {
+            "configurable": {"thread_id": thread_id or self.thread_id}
+        }
+        snapshot = await self._graph.aget_state(config)
+        message_ids = {message.id for message in snapshot.values.get("messages", [])}
+        input_ids = {
+            message.id
+            for message in inputs.get("messages", [])
+            if isinstance(message, BaseMessage) and message.id
+        }
+
+        try:
+            response: dict[str, Any] = await self._graph.ainvoke(inputs, config)
+        except asyncio.CancelledError:
+            removed_ids = await self._rollback(config, message_ids)
+            if self.message_store is not None:
+                self.message_store.discard(removed_ids - input_ids)
+            raise
         return response
+
+    async def _rollback(
+        self, config: RunnableConfig, message_ids: set[str]
+    ) -> set[str]:
+        """
+        Remove the messages of a thread that are not in `message_ids`.
+
+        Returns the IDs of the removed messages.
+        """
+        if self._graph is None:
+            return set()
+
+        snapshot = await self._graph.aget_state(config)
+        removals = [
+            RemoveMessage(id=message.id)
+            for message in snapshot.values.get("messages", [])
+            if message.id not in message_ids
+        ]
+        if removals:
+            await self._graph.aupdate_state(
+                config, {"messages": removals}, as_node="__start__"
+            )
+        return {removal.id for removal in removals if removal.id}
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Drop the stored conversation state of a thread.
+        """
+        self.memory.delete_thread(thread_id)
@@ -1,11 +1,14 @@
-from typing import Any, Literal, cast
+import asyncio
+from typing import Any, Literal, Optional, cast
 
-from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.messages import AIMessage, AnyMessage, BaseMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, state
 from pydantic import BaseModel, Field
 
 from app.core.agents import BaseAgent, BaseState
 from app.core.agents.registry import register_agent
+from app.core.memory import MessageStore
 
 ORCHESTRATOR_SYSTEM_PROMPT = """
 You are an intelligent Orchestrator Agent that serves as the central coordinator for a multi-agent system.
@@ -26,6 +29,9 @@ class OrchestratorState(BaseState):
     """
 
     active_agent: str = ""
+    answered: bool = False
+    # Running estimate of how often the thread is answered directly
+    direct_rate: float = 0.5
     specialized_agents: list[str] = Field(default_factory=list)
 
 
@@ -36,6 +42,12 @@ class OrchestratorAgent(BaseAgent):
     Serves as the central intelligence that analyzes user requests,
     determines whether to handle them directly or delegate to specialized
     agents, and manages the overall conversation flow.
+
+    In speculative mode, the direct answer is generated concurrently with the
+    routing analysis and kept only when the analysis decides to respond
+    directly, so conversational turns pay a single LLM latency instead of two.
+    Only short messages are speculated on, in threads whose recent turns were
+    mostly answered directly.
     """
 
     name: str = "orchestrator"
@@ -45,15 +57,52 @@ class OrchestratorAgent(BaseAgent):
     system_prompt: str = ORCHESTRATOR_SYSTEM_PROMPT
 
     def __init__(
-        self, *, thread_id: str, model_name: str, managed_agents: list[BaseAgent]
+        self,
+        *,
+        thread_id: str,
+        model_name: str,
+        managed_agents: list[BaseAgent],
+        node_models: Optional[dict[str, str]] = None,
+        message_store: Optional[MessageStore] = None,
+        speculative: bool = False,
+        speculative_max_length: int = 280,
+        speculative_min_confidence: float = 0.5,
     ) -> None:
         super().__init__(
             thread_id=thread_id,
             model_name=model_name,
+            node_models=node_models,
+            message_store=message_store,
         )
+        self.respond_model = self.get_model("respond")
         self.managed_agents = {agent.name: agent for agent in managed_agents}
+        self.speculative = speculative
+        self.speculative_max_length = speculative_max_length
+        self.speculative_min_confidence = speculative_min_confidence
         self._graph = self._create_graph()
 
+    def _should_speculate(self, state: OrchestratorState) -> bool:
+        """
+        Decide whether to start the direct answer before routing is known.
+        """
+        if not self.speculative or not state.messages:
+            return False
+
+        content = state.messages[-1].content
+        if not isinstance(content, str) or len(content) > self.speculative_max_length:
+            return False
+
+        return state.direct_rate >= self.speculative_min_confidence
+
+    async def _answer_directly(self, messages: list[AnyMessage]) -> AIMessage:
+        prompt = [SystemMessage(content=self.system_prompt), *messages]
+        return cast(AIMessage, await self.respond_model.ainvoke(prompt))
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        for agent in self.managed_agents.values():
+            agent.delete_thread(thread_id)
+
     def _create_graph(self) -> state.CompiledStateGraph:
         async def analyze_request(
             state: OrchestratorState,
@@ -68,7 +117,9 @@ class OrchestratorAgent(BaseAgent):
                     description="Name of the chosen agent to take the task."
                 )
 
-            structured_model = self.model.with_structured_output(Analyze)
+            structured_model = self.get_model(
+                "analyze", lambda model: model.with_structured_output(Analyze)
+            )
 
             # Create prompt with available agents
             agent_descriptions = "\n".join(
@@ -85,28 +136,55 @@ class OrchestratorAgent(BaseAgent):
                 "should be 'None'."
             )
 
+            # Start the direct answer alongside the analysis when speculating
+            speculation: asyncio.Task[AIMessage] | None = None
+            if self._should_speculate(state):
+                speculation = asyncio.create_task(self._answer_directly(state.messages))
+
             messages = [SystemMessage(content=analyze_prompt)] + state.messages
-            response = cast(Analyze, await structured_model.ainvoke(messages))
-            return {
+            try:
+                response = cast(Analyze, await structured_model.ainvoke(messages))
+            except BaseException:
+                if speculation is not None:
+                    await _cancel(speculation)
+                raise
+
+            is_direct = response.chosen_agent == "None"
+
+            update: dict[str, Any] = {
                 "active_agent": response.chosen_agent,
                 "specialized_agents": list(self.managed_agents),
+                "answered": False,
+                "direct_rate": _next_direct_rate(state.direct_rate, is_direct),
             }
+            if speculation is None:
+                return update
+
+            if not is_direct:
+                await _cancel(speculation)
+                return update
+
+            # Keep the speculative answer, falling back to `respond` on failure
+            try:
+                answer = await speculation
+            except Exception:
+                return update
+            return {**update, "messages": [answer], "answered": True}
 
         def route_from_analyze(
             state: OrchestratorState,
-        ) -> Literal["respond", "delegate"]:
+        ) -> Literal["respond", "delegate", "__end__"]:
             if state.active_agent == "None":
-                return "respond"
+                return "__end__" if state.answered else "respond"
             else:
                 return "delegate"
 
         async def respond_user(state: OrchestratorState) -> dict[str, list[AIMessage]]:
-            messages = [SystemMessage(content=self.system_prompt)] + state.messages
-            response = cast(AIMessage, await self.model.ainvoke(messages))
+            response = await self._answer_directly(state.messages)
             return {"messages": [response]}
 
         async def delegate_to_specialized_agent(
-            state: OrchestratorState,
+            state: OrchestratorState, config: RunnableConfig
         ) -> dict[str, list[BaseMessage]]:
             message_length = len(state.messages)
             agent_name = state.active_agent
@@ -119,10 +197,12 @@ class OrchestratorAgent(BaseAgent):
                 )
                 return {"messages": [AIMessage(content=error_msg)]}
 
-            # Execute specialized agent
+            # Execute specialized agent on the same thread, sharing the user
+            # message so the message store keeps a single copy of it
             agent = self.managed_agents[agent_name]
-            inputs = {"messages": [state.messages[-1].content]}
-            responses = await agent.run(inputs)
+            inputs = {"messages": [state.messages[-1]]}
+            thread_id = config["configurable"]["thread_id"]
+            responses = await agent.run(inputs, thread_id=thread_id)
 
             return {"messages": responses["messages"][message_length:]}
 
@@ -144,5 +224,21 @@ class OrchestratorAgent(BaseAgent):
         return graph
 
 
+def _next_direct_rate(rate: float, is_direct: bool, weight: float = 0.2) -> float:
+    return (1 - weight) * rate + weight * is_direct
+
+
+async def _cancel(task: asyncio.Task[Any]) -> None:
+    """
+    Cancel a speculative task and wait for it to finish unwinding.
+    """
+    task.cancel()
+    # Waiting does not raise the task's outcome, but still propagates a
+    # cancellation of the awaiting task itself
+    await asyncio.wait({task})
+    if not task.cancelled():
+        task.exception()
+
+
 # Register the agent in the registry
 register_agent(OrchestratorAgent.name, OrchestratorAgent)
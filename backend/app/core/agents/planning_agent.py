@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 
 from app.core.agents import BaseAgent, BaseState
 from app.core.agents.registry import register_agent
+from app.core.memory import MessageStore
 from app.core.tools import BaseTool
 
 PLANNER_AGENT_SYSTEM_PROMPT = """
@@ -49,13 +50,21 @@ class PlanningAgent(BaseAgent):
         model_name: str,
         thread_id: str,
         tools: Optional[list[BaseTool]] = None,
+        node_models: Optional[dict[str, str]] = None,
+        message_store: Optional[MessageStore] = None,
     ) -> None:
         super().__init__(
             thread_id=thread_id,
             model_name=model_name,
+            node_models=node_models,
+            message_store=message_store,
         )
         self.tools = tools or []
-        self.model_with_tools = self.model.bind_tools(self.tools)
+        self.model_with_tools = self.get_model(
+            "execute_step", lambda model: model.bind_tools(self.tools)
+        )
+        self.process_tools_model = self.get_model("process_tools")
+        self.respond_model = self.get_model("respond")
         self._graph = self._create_graph()
 
     def _create_graph(self) -> state.CompiledStateGraph:
@@ -67,7 +76,9 @@ class PlanningAgent(BaseAgent):
 
                 steps: list[str]
 
-            structured_model = self.model.with_structured_output(Plan)
+            structured_model = self.get_model(
+                "create_plan", lambda model: model.with_structured_output(Plan)
+            )
             messages = [SystemMessage(content=self.system_prompt)] + state.messages
             response = cast(Plan, await structured_model.ainvoke(messages))
 
@@ -97,7 +108,9 @@ class PlanningAgent(BaseAgent):
             return {"messages": [response], "current_step": next_step}
 
         async def process_tools(state: PlanState) -> dict[str, Any]:
-            response = cast(AIMessage, await self.model.ainvoke(state.messages))
+            response = cast(
+                AIMessage, await self.process_tools_model.ainvoke(state.messages)
+            )
             return {"messages": [response], "current_step": state.current_step + 1}
 
         def route_from_execute_step(
@@ -127,7 +140,7 @@ class PlanningAgent(BaseAgent):
                 "through the planning you did"
             )
             messages = [*state.messages, HumanMessage(content=prompt)]
-            response = cast(AIMessage, await self.model.ainvoke(messages))
+            response = cast(AIMessage, await self.respond_model.ainvoke(messages))
             return {"messages": [response]}
 
         # Build workflow graph
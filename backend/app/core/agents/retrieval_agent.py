@@ -1,17 +1,27 @@
-from typing import Annotated, Any
+import asyncio
+from collections import OrderedDict
+from typing import Annotated, Any, Optional
 
-from langchain.retrievers.multi_query import MultiQueryRetriever
+from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT, LineListOutputParser
 from langchain_core.documents import Document
 from langchain_core.messages import AIMessage
 from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langgraph.graph import StateGraph, state
-from pinecone import Pinecone, ServerlessSpec  # type: ignore[import-untyped]
+from pinecone import Index, Pinecone, ServerlessSpec  # type: ignore[import-untyped]
 from pydantic import Field
 
 from app.core.agents import BaseAgent, BaseState
 from app.core.agents.registry import register_agent
-from app.core.utils import reduce_docs
+from app.core.memory import MessageStore
+from app.core.quantization import QuantizationMode, QuantizedIndex, rescore
+from app.core.utils import (
+    generate_uuid,
+    get_encoding,
+    maximal_marginal_relevance,
+    pack_documents,
+    reduce_docs,
+)
 
 
 class RetrievalState(BaseState):
@@ -24,6 +34,22 @@ class RetrievalState(BaseState):
 class RetrievalAgent(BaseAgent):
     """
     Retrieval Agent that finds and returns relevant documents from the knowledge base.
+
+    Candidates for the question and its generated variants are narrowed down by
+    maximal marginal relevance, then packed into a token budget, so near
+    duplicate chunks do not crowd out the context.
+
+    The Pinecone index of the thread is only created once documents are added,
+    so threads that never upload documents do not cost an index.
+
+    Results are cached by normalized question until the next upload changes
+    the corpus, so repeated questions skip query generation and search.
+
+    With quantization enabled, candidates come from an in-memory quantized
+    index of the chat's chunks instead of one Pinecone query per variant, and
+    are rescored with their full precision embeddings fetched from Pinecone.
+    The quantized index is rebuilt from Pinecone when connecting to an index
+    that already holds documents.
     """
 
     name: str = "retrieval"
@@ -35,22 +61,67 @@ class RetrievalAgent(BaseAgent):
         *,
         thread_id: str,
         model_name: str,
+        node_models: Optional[dict[str, str]] = None,
+        message_store: Optional[MessageStore] = None,
+        fetch_k: int = 10,
+        top_k: int = 8,
+        mmr_lambda: float = 0.5,
+        token_budget: Optional[int] = 2000,
+        cache_size: int = 128,
+        embedding_model: str = "text-embedding-3-large",
+        embedding_dimensions: Optional[int] = None,
+        quantization: QuantizationMode = "none",
+        rescore_factor: int = 4,
     ) -> None:
-        super().__init__(thread_id=thread_id, model_name=model_name)
-        self.vector_store = self._init_vector_store()
-        self.retriever = MultiQueryRetriever.from_llm(
-            retriever=self.vector_store.as_retriever(),
-            llm=self.model,
+        super().__init__(
+            thread_id=thread_id,
+            model_name=model_name,
+            node_models=node_models,
+            message_store=message_store,
+        )
+        self.fetch_k = fetch_k
+        self.top_k = top_k
+        self.mmr_lambda = mmr_lambda
+        self.token_budget = token_budget
+        self.cache_size = cache_size
+        self.corpus_version = 0
+        self._cache: OrderedDict[tuple[int, str], list[Document]] = OrderedDict()
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self.rescore_factor = rescore_factor
+        self.quantized_index = (
+            QuantizedIndex(quantization) if quantization != "none" else None
+        )
+        self.embedding = OpenAIEmbeddings(
+            model=embedding_model, dimensions=embedding_dimensions
+        )
+        self.index: Optional[Index] = None
+        self._index_lock = asyncio.Lock()
+        self.query_chain = (
+            DEFAULT_QUERY_PROMPT | self.get_model("retrieve") | LineListOutputParser()
         )
         self._graph = self._create_graph()
 
-    def _init_vector_store(self) -> PineconeVectorStore:
-        embedding = OpenAIEmbeddings(model="text-embedding-3-large")
-        dimension = embedding.embed_query(".")
+    async def get_index(self, *, create: bool = False) -> Optional[Index]:
+        """
+        Connect to the Pinecone index of the thread, creating it if requested.
 
+        Returns None if the index does not exist and is not created.
+        """
+        async with self._index_lock:
+            if self.index is None:
+                self.index = await asyncio.to_thread(self._connect_index, create)
+            return self.index
+
+    def _connect_index(self, create: bool) -> Optional[Index]:
         pc = Pinecone()
-        existing_indexes = [index_info["name"] for index_info in pc.list_indexes()]
-        if self.thread_id not in existing_indexes:
+        exists = pc.has_index(self.thread_id)
+        if not exists:
+            if not create:
+                return None
+            dimension = self.embedding_dimensions or len(
+                self.embedding.embed_query(".")
+            )
             pc.create_index(
                 name=self.thread_id,
                 dimension=dimension,
@@ -60,15 +131,189 @@ class RetrievalAgent(BaseAgent):
             )
 
         index = pc.Index(name=self.thread_id)
-        vector_store = PineconeVectorStore(index=index, embedding=embedding)
-        return vector_store
+        if exists:
+            # Documents stored by another process are not in the quantized index
+            self._load_quantized(index)
+        return index
+
+    def _load_quantized(self, index: Index) -> None:
+        if self.quantized_index is None:
+            return
+
+        for ids in index.list():
+            response = index.fetch(ids=ids)
+            vectors = list(response.vectors.values())
+            self.quantized_index.add(
+                [vector.id for vector in vectors], [vector.values for vector in vectors]
+            )
+
+    async def delete_index(self) -> None:
+        """
+        Delete the Pinecone index of the thread together with its documents.
+        """
+        async with self._index_lock:
+            pc = Pinecone()
+            if await asyncio.to_thread(pc.has_index, self.thread_id):
+                await asyncio.to_thread(pc.delete_index, self.thread_id)
+            self.index = None
+
+        if self.quantized_index is not None:
+            self.quantized_index = QuantizedIndex(self.quantized_index.mode)
+        self.corpus_version += 1
+        self._cache.clear()
 
     async def add_documents(self, documents: list[Document]) -> None:
-        await self.vector_store.aadd_documents(documents)
+        index = await self.get_index(create=True)
+        if self.quantized_index is None:
+            vector_store = PineconeVectorStore(index=index, embedding=self.embedding)
+            await vector_store.aadd_documents(documents)
+        else:
+            await self._add_quantized(index, documents)
+        # Results cached for the previous corpus are stale from now on
+        self.corpus_version += 1
+        self._cache.clear()
+
+    async def _add_quantized(self, index: Index, documents: list[Document]) -> None:
+        if self.quantized_index is None or not documents:
+            return
+
+        # Embed once, upserting full precision and indexing the quantized codes
+        texts = [document.page_content for document in documents]
+        embeddings = await self.embedding.aembed_documents(texts)
+        ids = [generate_uuid() for _ in documents]
+        vectors = [
+            {
+                "id": vector_id,
+                "values": values,
+                "metadata": {**document.metadata, "text": document.page_content},
+            }
+            for vector_id, values, document in zip(
+                ids, embeddings, documents, strict=True
+            )
+        ]
+        await asyncio.to_thread(
+            index.upsert, vectors=vectors, batch_size=64, show_progress=False
+        )
+        self.quantized_index.add(ids, embeddings)
+
+    def _cache_key(self, question: str) -> tuple[int, str]:
+        return self.corpus_version, " ".join(question.lower().split())
+
+    def _get_cached(self, key: tuple[int, str]) -> Optional[list[Document]]:
+        if key not in self._cache:
+            return None
+        self._cache.move_to_end(key)
+        return self._cache[key]
+
+    def _set_cached(self, key: tuple[int, str], documents: list[Document]) -> None:
+        if self.cache_size <= 0 or key[0] != self.corpus_version:
+            return
+        self._cache[key] = documents
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def search(self, queries: list[str]) -> list[Document]:
+        """
+        Search the knowledge base for a diverse set of documents matching queries.
+        """
+        index = await self.get_index()
+        if index is None:
+            return []
+
+        query_embeddings = await self.embedding.aembed_documents(queries)
+        if self.quantized_index is None:
+            matches = await self._query_matches(index, query_embeddings)
+        else:
+            matches = await self._quantized_matches(index, query_embeddings)
+
+        selected = maximal_marginal_relevance(
+            query_embeddings,
+            [match["values"] for match in matches],
+            k=self.top_k,
+            lambda_mult=self.mmr_lambda,
+        )
+
+        documents = []
+        for i in selected:
+            metadata = dict(matches[i]["metadata"])
+            text = metadata.pop("text", "")
+            documents.append(
+                Document(id=matches[i]["id"], page_content=text, metadata=metadata)
+            )
+        if self.token_budget is None:
+            return documents
+
+        # Loading the tokenizer may download it, keep that off the event loop
+        encoding = await asyncio.to_thread(get_encoding, self.model_name)
+        return pack_documents(documents, self.token_budget, encoding)
+
+    async def _query_matches(
+        self, index: Index, query_embeddings: list[list[float]]
+    ) -> list[dict[str, Any]]:
+        results = await asyncio.gather(
+            *[
+                asyncio.to_thread(
+                    index.query,
+                    vector=embedding,
+                    top_k=self.fetch_k,
+                    include_values=True,
+                    include_metadata=True,
+                )
+                for embedding in query_embeddings
+            ]
+        )
+
+        candidates: dict[str, Any] = {}
+        for result in results:
+            for match in result["matches"]:
+                candidates.setdefault(
+                    match["id"],
+                    {
+                        "id": match["id"],
+                        "values": match["values"],
+                        "metadata": match["metadata"],
+                    },
+                )
+        return list(candidates.values())
+
+    async def _quantized_matches(
+        self, index: Index, query_embeddings: list[list[float]]
+    ) -> list[dict[str, Any]]:
+        if self.quantized_index is None:
+            return []
+
+        candidate_ids: set[str] = set()
+        for embedding in query_embeddings:
+            candidate_ids.update(
+                self.quantized_index.search(
+                    embedding, self.fetch_k * self.rescore_factor
+                )
+            )
+        if not candidate_ids:
+            return []
+
+        response = await asyncio.to_thread(index.fetch, ids=list(candidate_ids))
+        vectors = list(response.vectors.values())
+        selected = rescore(
+            query_embeddings, [vector.values for vector in vectors], k=self.fetch_k
+        )
+        return [
+            {
+                "id": vectors[i].id,
+                "values": vectors[i].values,
+                "metadata": vectors[i].metadata,
+            }
+            for i in selected
+        ]
 
     def _create_graph(self) -> state.CompiledStateGraph:
         async def retrieve_documents(state: RetrievalState) -> dict[str, Any]:
-            docs = await self.retriever.ainvoke(state.question)
+            key = self._cache_key(state.question)
+            docs = self._get_cached(key)
+            if docs is None:
+                queries = await self.query_chain.ainvoke({"question": state.question})
+                docs = await self.search([state.question, *queries])
+                self._set_cached(key, docs)
             message = AIMessage(
                 content=f"Retrieving {len(docs)} documents relevant to the query."
             )
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterable, AsyncIterator, Container
+
+from pydantic import ValidationError
+
+from app.core.agents import BaseAgent
+from app.schemas.chat import BatchItem, BatchResult
+
+
+async def run_batch(
+    agent: BaseAgent,
+    lines: AsyncIterable[str],
+    *,
+    batch_id: str,
+    concurrency: int = 8,
+    skip_ids: Container[str] = frozenset(),
+) -> AsyncIterator[BatchResult]:
+    """
+    Run a JSONL stream of `BatchItem` through a shared agent.
+
+    At most `concurrency` items run at once and results are yielded as they
+    complete. Items of the same chat share a thread, so they run one after
+    another in input order. Items default to `line-<n>` as ID, so a batch can
+    be resumed by passing the IDs of finished items as `skip_ids`. Items
+    repeating an earlier ID are rejected with an error result.
+
+    Chat state does not outlive the agent, so skipped turns of a chat are
+    replayed before its next unfinished turn. Replayed turns only yield a
+    result if they fail.
+    """
+    pending: set[asyncio.Task[BatchResult]] = set()
+    replays: set[asyncio.Task[BatchResult]] = set()
+    # Chat ID -> items waiting for the running item of that chat
+    queued: dict[str, deque[tuple[BatchItem, str, bool]]] = {}
+    # Chat ID -> skipped items to replay if a later turn of the chat runs
+    skipped: dict[str, list[tuple[BatchItem, str]]] = {}
+
+    def start(item: BatchItem, item_id: str, replay: bool) -> None:
+        if item.chat_id is not None:
+            queued.setdefault(item.chat_id, deque())
+        task = asyncio.create_task(_run_item(agent, item, item_id, batch_id))
+        pending.add(task)
+        if replay:
+            replays.add(task)
+
+    async def next_results() -> list[BatchResult]:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        pending.difference_update(done)
+        results = []
+        for task in done:
+            result = task.result()
+            if task not in replays or result.error is not None:
+                results.append(result)
+            replays.discard(task)
+
+            # Start the next turn of the chat in place of the finished one
+            if result.chat_id is None:
+                continue
+            if queued[result.chat_id]:
+                start(*queued[result.chat_id].popleft())
+            else:
+                del queued[result.chat_id]
+        return results
+
+    seen_ids: set[str] = set()
+
+    try:
+        line_number = 0
+        async for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+
+            try:
+                item = BatchItem.model_validate_json(line)
+            except ValidationError as e:
+                yield BatchResult(id=f"line-{line_number}", error=str(e), elapsed=0.0)
+                continue
+
+            item_id = item.id or f"line-{line_number}"
+            if item_id in seen_ids:
+                yield BatchResult(
+                    id=item_id,
+                    chat_id=item.chat_id,
+                    error=f"Duplicate item ID on line {line_number}",
+                    elapsed=0.0,
+                )
+                continue
+            seen_ids.add(item_id)
+
+            if item_id in skip_ids:
+                if item.chat_id is not None:
+                    skipped.setdefault(item.chat_id, []).append((item, item_id))
+                continue
+
+            turns = [(item, item_id, False)]
+            if item.chat_id is not None:
+                replayed = skipped.pop(item.chat_id, [])
+                turns = [(*turn, True) for turn in replayed] + turns
+
+            if item.chat_id in queued:
+                queued[item.chat_id].extend(turns)
+                continue
+
+            # Finished items may free their slot for the next turn of a chat
+            while len(pending) >= concurrency:
+                for result in await next_results():
+                    yield result
+
+            start(*turns[0])
+            if item.chat_id is not None:
+                queued[item.chat_id].extend(turns[1:])
+
+        while pending:
+            for result in await next_results():
+                yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _run_item(
+    agent: BaseAgent, item: BatchItem, item_id: str, batch_id: str
+) -> BatchResult:
+    thread_id = item.chat_id or f"{batch_id}-{item_id}"
+    start = time.perf_counter()
+    try:
+        response = await agent.run({"messages": [item.message]}, thread_id=thread_id)
+        return BatchResult(
+            id=item_id,
+            chat_id=item.chat_id,
+            response=str(response["messages"][-1].content),
+            elapsed=time.perf_counter() - start,
+        )
+    except Exception as e:
+        return BatchResult(
+            id=item_id,
+            chat_id=item.chat_id,
+            error=f"{type(e).__name__}: {e}",
+            elapsed=time.perf_counter() - start,
+        )
+    finally:
+        # One-off threads are not needed once the item is answered
+        if item.chat_id is None:
+            agent.delete_thread(thread_id)
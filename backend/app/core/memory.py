@@ -0,0 +1,178 @@
+import json
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from langchain_core.messages import BaseMessage, RemoveMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+MESSAGE_REFS_TYPE = "message_refs"
+
+
+class MessageStore:
+    """
+    Shared store holding a single copy of each message, keyed by message ID.
+
+    Messages are treated as immutable: storing a message under an existing ID
+    replaces the previous copy for every holder of that reference.
+    """
+
+    def __init__(self) -> None:
+        self._messages: dict[str, BaseMessage] = {}
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def put(self, message: BaseMessage) -> str:
+        if not message.id:
+            raise ValueError("Message must have an ID to be stored")
+        self._messages[message.id] = message
+        return message.id
+
+    def get(self, message_id: str) -> BaseMessage:
+        return self._messages[message_id]
+
+    def discard(self, message_ids: Iterable[str]) -> None:
+        """
+        Remove messages no checkpoint refers to anymore, ignoring unknown IDs.
+        """
+        for message_id in message_ids:
+            self._messages.pop(message_id, None)
+
+
+class MessageRefSerializer(SerializerProtocol):
+    """
+    Serializer that stores message lists as references into a `MessageStore`.
+
+    Any other value, or a message list containing messages without an ID or
+    removals, which share the ID of the message they remove, is delegated to
+    the wrapped serializer.
+    """
+
+    def __init__(
+        self, store: MessageStore, serde: Optional[SerializerProtocol] = None
+    ) -> None:
+        self.store = store
+        self.serde = serde or JsonPlusSerializer()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if (
+            isinstance(obj, list)
+            and obj
+            and all(
+                isinstance(item, BaseMessage)
+                and not isinstance(item, RemoveMessage)
+                and item.id
+                for item in obj
+            )
+        ):
+            message_ids = [self.store.put(message) for message in obj]
+            return MESSAGE_REFS_TYPE, json.dumps(message_ids).encode()
+        return self.serde.dumps_typed(obj)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, data_ = data
+        if type_ == MESSAGE_REFS_TYPE:
+            return [self.store.get(message_id) for message_id in json.loads(data_)]
+        return self.serde.loads_typed(data)
+
+
+class PrunedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer that only keeps the latest checkpoints of a thread.
+
+    Older checkpoints are dropped together with their pending writes and the
+    channel values no remaining checkpoint refers to. At least two checkpoints
+    are kept so the parent of the latest one stays available.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_checkpoints: Optional[int] = None,
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        if max_checkpoints is not None and max_checkpoints < 2:
+            raise ValueError("At least two checkpoints must be kept per thread")
+
+        super().__init__(serde=serde)
+        self.max_checkpoints = max_checkpoints
+        # (thread ID, checkpoint NS) -> keys of the blobs stored for it
+        self._blob_keys: defaultdict[
+            tuple[str, str], set[tuple[str, str, str, str | int | float]]
+        ] = defaultdict(set)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = next_config["configurable"]["thread_id"]
+        checkpoint_ns = next_config["configurable"]["checkpoint_ns"]
+        self._blob_keys[(thread_id, checkpoint_ns)].update(
+            (thread_id, checkpoint_ns, channel, version)
+            for channel, version in new_versions.items()
+        )
+
+        if self.max_checkpoints is not None:
+            self._prune(thread_id, checkpoint_ns, self.max_checkpoints)
+        return next_config
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Delete all checkpoints, writes and channel values of a thread.
+        """
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            for key in self._blob_keys.pop((thread_id, checkpoint_ns), set()):
+                self.blobs.pop(key, None)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str, keep: int) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= keep:
+            return
+
+        # Checkpoint IDs are time-ordered, the newest sorts last
+        stale_ids = sorted(checkpoints)[:-keep]
+        for checkpoint_id in stale_ids:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        # Channel versions only grow, so anything older than what the oldest
+        # remaining checkpoint refers to is unreachable
+        oldest = self.serde.loads_typed(checkpoints[min(checkpoints)][0])
+        min_versions: ChannelVersions = oldest["channel_versions"]
+        blob_keys = self._blob_keys[(thread_id, checkpoint_ns)]
+        stale_blobs = {
+            key
+            for key in blob_keys
+            if key[2] in min_versions
+            and _version_number(key[3]) < _version_number(min_versions[key[2]])
+        }
+        for key in stale_blobs:
+            self.blobs.pop(key, None)
+        blob_keys -= stale_blobs
+
+
+def _version_number(version: str | int | float) -> int:
+    if isinstance(version, str):
+        return int(version.split(".")[0])
+    return int(version)
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import FrameType
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def format_stack(frame: Optional[FrameType]) -> list[str]:
+    """
+    Describe the frames of a stack, outermost first.
+    """
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        # Semicolons separate frames in the folded format
+        location = f"{code.co_filename}:{frame.f_lineno}".replace(";", ":")
+        stack.append(f"{code.co_name} ({location})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class StackSampler:
+    """
+    Sampling profiler that periodically records the stacks of running threads.
+
+    Samples are aggregated in the folded format understood by flamegraph.pl,
+    speedscope and most other flamegraph tools: one line per distinct stack,
+    frames joined by semicolons, followed by the number of samples.
+    """
+
+    def __init__(
+        self, *, interval: float = 0.005, thread_id: Optional[int] = None
+    ) -> None:
+        """
+        Sample every `interval` seconds, only `thread_id` if given.
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> str:
+        """
+        Stop sampling and return the samples in the folded format.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.folded()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_id is not None and thread_id != self.thread_id:
+                    continue
+                thread_name = thread_names.get(thread_id, str(thread_id))
+                stack = [thread_name, *format_stack(frame)]
+                self.samples[";".join(stack)] += 1
+
+
+class LoopLagMonitor:
+    """
+    Monitor for how late the event loop runs scheduled work.
+
+    A heartbeat task measures the lag of each wake-up. A watchdog thread
+    captures the stack of the loop thread whenever a heartbeat is overdue by
+    more than `slow_threshold`, pointing at the code blocking the loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.5,
+        slow_threshold: float = 0.1,
+        max_reports: int = 20,
+    ) -> None:
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.slow_callbacks: deque[dict[str, Any]] = deque(maxlen=max_reports)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Start monitoring the running event loop.
+        """
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "slow_callbacks": list(self.slow_callbacks),
+        }
+
+    async def _beat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - start - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+            self._heartbeat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported = 0.0
+        while not self._stop.wait(self.slow_threshold / 2):
+            heartbeat = self._heartbeat
+            overdue = time.monotonic() - heartbeat - self.interval
+            if overdue < self.slow_threshold or heartbeat == reported:
+                continue
+
+            # Report each stall once, with the stack blocking the loop
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id or 0)
+            stack = format_stack(frame)
+            self.slow_callbacks.append(
+                {"time": time.time(), "blocked_for": overdue, "stack": stack}
+            )
+            logger.warning(
+                "Event loop blocked for more than %.3fs at:\n  %s",
+                overdue,
+                "\n  ".join(stack[-10:]),
+            )
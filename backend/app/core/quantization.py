@@ -0,0 +1,115 @@
+from typing import Literal
+
+import numpy as np
+import numpy.typing as npt
+
+from app.core.utils import normalize
+
+QuantizationMode = Literal["none", "int8", "binary"]
+
+# Number of set bits of every byte value
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+class QuantizedIndex:
+    """
+    In-memory index of quantized embeddings for a fast first search stage.
+
+    `int8` keeps one signed byte per dimension with a scale per vector, and
+    `binary` keeps one sign bit per dimension and ranks by Hamming distance.
+    Scores are approximate, so candidates should be rescored with the full
+    precision embeddings.
+    """
+
+    def __init__(self, mode: Literal["int8", "binary"]) -> None:
+        self.mode = mode
+        self.ids: list[str] = []
+        self._codes: npt.NDArray[np.int8 | np.uint8] | None = None
+        self._scales: npt.NDArray[np.float32] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the quantized embeddings.
+        """
+        codes = 0 if self._codes is None else self._codes.nbytes
+        scales = 0 if self._scales is None else self._scales.nbytes
+        return codes + scales
+
+    def add(self, ids: list[str], embeddings: npt.ArrayLike) -> None:
+        vectors = normalize(embeddings)
+        if len(vectors) == 0:
+            return
+
+        codes: npt.NDArray[np.int8 | np.uint8]
+        if self.mode == "int8":
+            codes, scales = quantize_int8(vectors)
+            self._scales = (
+                scales
+                if self._scales is None
+                else np.concatenate([self._scales, scales])
+            )
+        else:
+            codes = quantize_binary(vectors)
+
+        self._codes = codes if self._codes is None else np.vstack([self._codes, codes])
+        self.ids.extend(ids)
+
+    def search(self, query: npt.ArrayLike, k: int) -> list[str]:
+        """
+        Return the IDs of the `k` embeddings closest to a query, best first.
+        """
+        if self._codes is None or k <= 0:
+            return []
+
+        vector = normalize(np.atleast_2d(np.asarray(query)))[0]
+        if self.mode == "int8" and self._scales is not None:
+            scores = (self._codes @ vector) * self._scales
+        else:
+            distances = _POPCOUNT[self._codes ^ quantize_binary(vector[None])].sum(
+                axis=1
+            )
+            scores = -distances.astype(np.float32)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.ids[i] for i in top[np.argsort(-scores[top])]]
+
+
+def quantize_int8(
+    embeddings: npt.NDArray[np.float32],
+) -> tuple[npt.NDArray[np.int8], npt.NDArray[np.float32]]:
+    """
+    Quantize embeddings to int8 codes with a symmetric scale per vector.
+    """
+    scales = np.abs(embeddings).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.round(embeddings / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(embeddings: npt.NDArray[np.float32]) -> npt.NDArray[np.uint8]:
+    """
+    Quantize embeddings to their packed sign bits.
+    """
+    return np.packbits(embeddings > 0, axis=1)
+
+
+def rescore(
+    query_embeddings: npt.ArrayLike, embeddings: npt.ArrayLike, k: int
+) -> list[int]:
+    """
+    Select the indices of the `k` best embeddings for each query, by exact cosine.
+    """
+    queries = normalize(np.atleast_2d(np.asarray(query_embeddings)))
+    vectors = normalize(embeddings)
+    if len(vectors) == 0 or k <= 0:
+        return []
+
+    similarities = vectors @ queries.T
+    k = min(k, len(vectors))
+    top = np.argpartition(-similarities, k - 1, axis=0)[:k]
+    return sorted({int(i) for i in top.ravel()})
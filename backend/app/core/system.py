@@ -0,0 +1,63 @@
+from typing import Any, Optional
+
+from app.config import settings
+from app.core.agents import BaseAgent, OrchestratorAgent, PlanningAgent, RetrievalAgent
+from app.core.memory import MessageStore
+from app.core.tools import BaseTool, WebSearchTool
+
+
+async def initialize_agent_system(
+    chat_id: str, message_store: Optional[MessageStore] = None
+) -> OrchestratorAgent:
+    """Initialize the agent system based on the requested agent type."""
+
+    tools: list[BaseTool] = [WebSearchTool()]
+    agents: list[BaseAgent] = [
+        PlanningAgent(
+            thread_id=chat_id,
+            tools=tools,
+            message_store=message_store,
+            **_model_config(PlanningAgent.name),
+        ),
+        RetrievalAgent(
+            thread_id=chat_id,
+            message_store=message_store,
+            fetch_k=settings.RETRIEVAL_FETCH_K,
+            top_k=settings.RETRIEVAL_TOP_K,
+            mmr_lambda=settings.RETRIEVAL_MMR_LAMBDA,
+            token_budget=settings.RETRIEVAL_TOKEN_BUDGET,
+            cache_size=settings.RETRIEVAL_CACHE_SIZE,
+            embedding_model=settings.EMBEDDING_MODEL,
+            embedding_dimensions=settings.EMBEDDING_DIMENSIONS,
+            quantization=settings.EMBEDDING_QUANTIZATION,
+            rescore_factor=settings.EMBEDDING_RESCORE_FACTOR,
+            **_model_config(RetrievalAgent.name),
+        ),
+    ]
+
+    return OrchestratorAgent(
+        thread_id=chat_id,
+        managed_agents=agents,
+        message_store=message_store,
+        **_model_config(OrchestratorAgent.name),
+        speculative=settings.ORCHESTRATOR_SPECULATIVE,
+        speculative_max_length=settings.ORCHESTRATOR_SPECULATIVE_MAX_LENGTH,
+        speculative_min_confidence=settings.ORCHESTRATOR_SPECULATIVE_MIN_CONFIDENCE,
+    )
+
+
+async def delete_agent_system(agent: OrchestratorAgent) -> None:
+    """Delete the external resources of an agent system, such as its indexes."""
+
+    for managed_agent in agent.managed_agents.values():
+        if isinstance(managed_agent, RetrievalAgent):
+            await managed_agent.delete_index()
+
+
+def _model_config(agent_name: str) -> dict[str, Any]:
+    """Resolve the agent-level and node-level models for an agent."""
+
+    return {
+        "model_name": settings.AGENT_MODELS.get(agent_name, settings.MODEL_NAME),
+        "node_models": settings.NODE_MODELS.get(agent_name, {}),
+    }
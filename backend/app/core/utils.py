@@ -1,9 +1,16 @@
 import hashlib
+import logging
+import math
 import uuid
-from typing import Literal
+from typing import Literal, Optional
 
+import numpy as np
+import numpy.typing as npt
+import tiktoken
 from langchain_core.documents import Document
 
+logger = logging.getLogger(__name__)
+
 
 def generate_uuid(
     kind: Literal["random", "hash"] = "random", value: str | None = None
@@ -49,3 +56,110 @@ def reduce_docs(
                 exist_ids.add(item_id)
 
     return exist_list + new_list
+
+
+def maximal_marginal_relevance(
+    query_embeddings: npt.ArrayLike,
+    embeddings: npt.ArrayLike,
+    k: int,
+    lambda_mult: float = 0.5,
+) -> list[int]:
+    """
+    Select the indices of `k` relevant but mutually diverse embeddings.
+
+    Relevance is the best cosine similarity to any of the query embeddings.
+    `lambda_mult` trades relevance (1.0) against diversity (0.0).
+    """
+    docs = normalize(embeddings)
+    if k <= 0 or len(docs) == 0:
+        return []
+
+    queries = normalize(np.atleast_2d(np.asarray(query_embeddings)))
+    relevance = (docs @ queries.T).max(axis=1)
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = docs @ docs[selected[0]]
+    for _ in range(min(k, len(docs)) - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        index = int(np.argmax(scores))
+        selected.append(index)
+        np.maximum(redundancy, docs @ docs[index], out=redundancy)
+
+    return selected
+
+
+def normalize(embeddings: npt.ArrayLike) -> npt.NDArray[np.float32]:
+    """
+    Scale embeddings to unit length, so dot products are cosine similarities.
+    """
+    array = np.asarray(embeddings, dtype=np.float32)
+    if array.size == 0:
+        return array.reshape(0, 0)
+    norms = np.linalg.norm(array, axis=-1, keepdims=True)
+    normalized: npt.NDArray[np.float32] = array / np.where(norms == 0, 1, norms)
+    return normalized
+
+
+# Loaded tokenizers by model name, failed loads are retried on the next call
+_encodings: dict[str, tiktoken.Encoding] = {}
+
+
+def get_encoding(model_name: str) -> Optional[tiktoken.Encoding]:
+    """
+    Get the tokenizer of a model, None if it cannot be loaded.
+
+    The first load may download the tokenizer, so call it off the event loop.
+    """
+    if model_name not in _encodings:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                # Unknown models get the encoding of the current OpenAI models
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(
+                "Could not load the tokenizer for %s, estimating token counts: %s",
+                model_name,
+                e,
+            )
+            return None
+        _encodings[model_name] = encoding
+    return _encodings[model_name]
+
+
+def estimate_tokens(text: str, encoding: Optional[tiktoken.Encoding] = None) -> int:
+    """
+    Count the tokens of a text with a tokenizer.
+
+    Without a tokenizer, the count is estimated at about four characters per
+    token.
+    """
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def pack_documents(
+    documents: list[Document],
+    max_tokens: Optional[int],
+    encoding: Optional[tiktoken.Encoding] = None,
+) -> list[Document]:
+    """
+    Keep documents in order while they fit in a token budget.
+
+    Documents too large for the remaining budget are skipped so smaller ones
+    further down can still fill it. Tokens are counted with `encoding`.
+    """
+    if max_tokens is None:
+        return documents
+
+    packed = []
+    remaining = max_tokens
+    for document in documents:
+        tokens = estimate_tokens(document.page_content, encoding)
+        if tokens <= remaining:
+            packed.append(document)
+            remaining -= tokens
+    return packed
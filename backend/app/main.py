@@ -1,15 +1,39 @@
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.api.routers.admin import ProfileRequestMiddleware
 from app.config import settings
+from app.core.profiling import LoopLagMonitor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    # Watch the event loop for lag and blocking calls
+    app.state.loop_monitor = LoopLagMonitor(
+        interval=settings.LOOP_MONITOR_INTERVAL,
+        slow_threshold=settings.LOOP_SLOW_CALLBACK_THRESHOLD,
+    )
+    if settings.LOOP_MONITOR_ENABLED:
+        app.state.loop_monitor.start()
+    yield
+    if settings.LOOP_MONITOR_ENABLED:
+        await app.state.loop_monitor.stop()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API for interacting with a system of specialized AI agents",
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
+# Profile requests sent with the debug header
+app.add_middleware(ProfileRequestMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -23,3 +23,23 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     chat_id: str = Field(description="Chat ID")
     response: str = Field(description="Assistant response")
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = Field(
+        default=None, description="Item identifier, defaults to `line-<n>`"
+    )
+    chat_id: Optional[str] = Field(
+        default=None, description="Chat to continue, a fresh thread is used if omitted"
+    )
+    message: str = Field(description="User message")
+
+
+class BatchResult(BaseModel):
+    id: str = Field(description="Item identifier")
+    chat_id: Optional[str] = Field(
+        default=None, description="Chat ID, if one was given"
+    )
+    response: Optional[str] = Field(default=None, description="Assistant response")
+    error: Optional[str] = Field(default=None, description="Error raised by the item")
+    elapsed: float = Field(description="Processing time in seconds")
@@ -0,0 +1,164 @@
+"""
+Measure recall and search latency of reduced and quantized embeddings.
+
+Usage:
+    python -m benchmarks.embedding_storage corpus/*.txt --cache embeddings.npz
+    python -m benchmarks.embedding_storage --synthetic 5000
+
+Chunks of the corpus are embedded once at the model's native size. Shorter
+embeddings are derived by truncating and renormalizing, which is how
+text-embedding-3 models shorten embeddings. Queries are the opening of
+randomly sampled chunks, and recall@k is measured against exact search at
+the native size.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+from langchain_core.documents import Document
+from langchain_openai import OpenAIEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.quantization import QuantizedIndex, rescore
+from app.core.utils import normalize
+
+Vectors = npt.NDArray[np.float32]
+
+
+def load_corpus(
+    paths: list[Path], model: str, num_queries: int, seed: int
+) -> tuple[Vectors, Vectors]:
+    documents = [
+        Document(page_content=path.read_text(encoding="utf-8")) for path in paths
+    ]
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    chunks = [chunk.page_content for chunk in splitter.split_documents(documents)]
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(chunks), size=min(num_queries, len(chunks)), replace=False)
+    queries = [chunks[i][:200] for i in sample]
+
+    embedding = OpenAIEmbeddings(model=model)
+    corpus = normalize(embedding.embed_documents(chunks))
+    return corpus, normalize(embedding.embed_documents(queries))
+
+
+def synthetic_corpus(
+    size: int, num_queries: int, dimensions: int, seed: int
+) -> tuple[Vectors, Vectors]:
+    """
+    Clustered vectors whose leading dimensions carry most of the variance.
+    """
+    rng = np.random.default_rng(seed)
+    decay = 1 / np.sqrt(1 + np.arange(dimensions) / 64)
+    centers = rng.normal(size=(max(size // 20, 1), dimensions)) * decay
+    labels = rng.integers(len(centers), size=size)
+    corpus = centers[labels] + 0.5 * rng.normal(size=(size, dimensions)) * decay
+    sample = rng.choice(size, size=min(num_queries, size), replace=False)
+    queries = corpus[sample] + 0.5 * rng.normal(size=(len(sample), dimensions)) * decay
+    return normalize(corpus), normalize(queries)
+
+
+def top_k(corpus: Vectors, query: Vectors, k: int) -> npt.NDArray[np.intp]:
+    scores = corpus @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def evaluate(
+    corpus: Vectors,
+    queries: Vectors,
+    truth: list[set[int]],
+    *,
+    dimensions: int,
+    mode: str,
+    k: int,
+    rescore_factor: int,
+) -> tuple[float, float, float]:
+    """
+    Return the recall@k, milliseconds per query and bytes per vector.
+    """
+    reduced = normalize(corpus[:, :dimensions])
+    reduced_queries = normalize(queries[:, :dimensions])
+
+    index = None
+    if mode != "none":
+        index = QuantizedIndex("int8" if mode == "int8" else "binary")
+        index.add([str(i) for i in range(len(reduced))], reduced)
+
+    hits = 0
+    start = time.perf_counter()
+    for query, relevant in zip(reduced_queries, truth, strict=True):
+        if index is None:
+            found = {int(i) for i in top_k(reduced, query, k)}
+        else:
+            # Rescore the quantized candidates at full precision
+            candidates = [int(i) for i in index.search(query, k * rescore_factor)]
+            found = {candidates[i] for i in rescore(query, reduced[candidates], k)}
+        hits += len(found & relevant)
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+
+    if index is None:
+        size = reduced.nbytes / len(reduced)
+    else:
+        size = index.nbytes / len(index)
+    return hits / (k * len(queries)), elapsed, size
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", type=Path, nargs="*", help="Text files to embed")
+    parser.add_argument("--model", default="text-embedding-3-large")
+    parser.add_argument("--cache", type=Path, help="File to keep embeddings in")
+    parser.add_argument("--synthetic", type=int, help="Use N synthetic vectors")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[3072, 1024, 256])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.cache and args.cache.exists():
+        saved = np.load(args.cache)
+        corpus, queries = saved["corpus"], saved["queries"]
+    elif args.synthetic:
+        corpus, queries = synthetic_corpus(
+            args.synthetic, args.queries, max(args.dimensions), args.seed
+        )
+    elif args.corpus:
+        corpus, queries = load_corpus(args.corpus, args.model, args.queries, args.seed)
+    else:
+        parser.error("provide corpus files, --cache or --synthetic")
+
+    if args.cache and not args.cache.exists():
+        np.savez(args.cache, corpus=corpus, queries=queries)
+
+    k = min(args.k, len(corpus))
+    truth = [{int(i) for i in top_k(corpus, query, k)} for query in queries]
+
+    print(f"{len(corpus)} vectors, {len(queries)} queries, recall@{k}")
+    print(f"{'dims':>6} {'mode':>7} {'recall':>7} {'ms/query':>9} {'bytes/vec':>10}")
+    for dimensions in args.dimensions:
+        if dimensions > corpus.shape[1]:
+            continue
+        for mode in ("none", "int8", "binary"):
+            recall, elapsed, size = evaluate(
+                corpus,
+                queries,
+                truth,
+                dimensions=dimensions,
+                mode=mode,
+                k=k,
+                rescore_factor=args.rescore_factor,
+            )
+            print(
+                f"{dimensions:>6} {mode:>7} {recall:>7.3f} "
+                f"{elapsed:>9.3f} {size:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()